@@ -2,8 +2,17 @@ import sys
 import os
 import pickle
 import gzip
+import io
+import mmap
 import argparse
 import math
+import random
+import ctypes
+import hashlib
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stdout
 
 # Try importing optional ML dependencies
 try:
@@ -12,36 +21,249 @@ try:
 except ImportError:
     HAS_NUMPY = False
 
+try:
+    import joblib
+    HAS_JOBLIB = True
+except ImportError:
+    HAS_JOBLIB = False
+
+# Optional native histogram (see hist256.c for the build command)
+_hist_lib = None
+if HAS_NUMPY:
+    try:
+        _hist_lib = ctypes.CDLL(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'libhist256.so'))
+        _hist_lib.hist256.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+        _hist_lib.hist256.restype = None
+    except OSError:
+        _hist_lib = None
+
+_INV_LN256 = 1.0 / math.log(256)
+
 # Add the vs directory to path so we can import feature extraction if needed, 
 # although we will duplicate the simple entropy logic here to keep it standalone.
 sys.path.append(os.path.join(os.path.dirname(__file__), 'vs'))
 
+def _histogram_kernel(buf):
+    # Byte histogram over a uint8 view, compiled by numba on first use
+    counts = np.zeros(256, np.int64)
+    for b in buf:
+        counts[b] += 1
+    return counts
+
+# None until first use, then the jitted kernel or False if numba is unavailable
+_histogram_nb = None
+
+# Importing numba and loading/compiling the kernel costs ~0.5 s, which only
+# pays off against np.bincount once this many bytes are being histogrammed
+_NUMBA_MIN_BYTES = 256 << 20
+
+def _numba_histogram_kernel():
+    """
+    Imports numba lazily (it adds ~200 ms to startup) and JIT-compiles the
+    histogram kernel the first time it is needed.
+    """
+    global _histogram_nb
+    if _histogram_nb is None:
+        try:
+            from numba import njit
+            _histogram_nb = njit(cache=True)(_histogram_kernel)
+        except ImportError:
+            _histogram_nb = False
+    return _histogram_nb
+
+def _bincount256(arr):
+    """
+    Returns the 256-bin byte histogram of a uint8 ndarray, using the native
+    hist256 kernel when it has been built and np.bincount otherwise.
+    """
+    if _hist_lib is None:
+        return np.bincount(arr, minlength=256)
+
+    arr = np.ascontiguousarray(arr)
+    out = np.zeros(256, np.uint64)
+    _hist_lib.hist256(arr.ctypes.data, arr.size, out.ctypes.data)
+    return out.view(np.int64)
+
+def _histogram_for(nbytes):
+    """
+    Picks the histogram function for a job of nbytes in total: the native
+    kernel if built, the numba kernel for inputs big enough to amortise the
+    JIT, and _bincount256 (np.bincount) otherwise.
+    """
+    if _hist_lib is None and nbytes >= _NUMBA_MIN_BYTES:
+        kernel = _numba_histogram_kernel()
+        if kernel:
+            return kernel
+    return _bincount256
+
+def calculate_entropy_from_array(arr):
+    """
+    Calculates the Shannon entropy of a uint8 ndarray without copying it.
+    """
+    if arr.size == 0:
+        return 0.0
+
+    # Vectorized histogram: one C pass over the buffer instead of a Python loop
+    return _entropy_from_counts(_histogram_for(arr.size)(arr))
+
+def _entropy_from_counts(counts):
+    """
+    Calculates the normalised Shannon entropy from a 256-bin byte histogram.
+    """
+    nz = counts[counts > 0].astype(np.float64)
+    if nz.size == 0:
+        return 0.0
+    p = nz / nz.sum()
+    return float(-(p * np.log(p)).sum() * _INV_LN256)
+
+def _scan_stream(path, chunk=4 << 20):
+    """
+    Reads the file in chunks and folds each one into the byte histogram while
+    a worker thread reads the next chunk (os.read and bincount release the GIL).
+    Returns (histogram, total bytes read).
+    """
+    hist = np.zeros(256, np.int64) if HAS_NUMPY else Counter()
+    total = 0
+
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        if HAS_NUMPY:
+            histogram = _histogram_for(os.fstat(fd).st_size)
+        with ThreadPoolExecutor(max_workers=1) as reader:
+            pending = reader.submit(os.read, fd, chunk)
+            while True:
+                buf = pending.result()
+                if not buf:
+                    break
+                pending = reader.submit(os.read, fd, chunk)
+                total += len(buf)
+                if HAS_NUMPY:
+                    hist += histogram(np.frombuffer(buf, dtype=np.uint8))
+                else:
+                    hist.update(buf)
+    finally:
+        os.close(fd)
+
+    return hist, total
+
+# Size of each piece read by _sample_stream, and so the smallest usable --sample-bytes
+SAMPLE_BLOCK = 4096
+
+def _sample_stream(path, file_size, sample_bytes, block=SAMPLE_BLOCK):
+    """
+    Builds the byte histogram from sample_bytes // block pseudo-randomly chosen
+    block-sized pieces of the file instead of reading all of it. Entropy
+    estimated this way is stable for large files, so the ML feature costs
+    O(sample_bytes) rather than O(file_size). Returns (histogram, bytes sampled).
+    """
+    nblocks = file_size // block
+    if nblocks == 0:
+        # Nothing block-sized to sample from; the file is small enough to read in full
+        return _scan_stream(path)
+
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        def read_at(offset):
+            # lseek + read rather than os.pread, which doesn't exist on Windows
+            os.lseek(fd, offset, os.SEEK_SET)
+            return os.read(fd, block)
+
+        # Seed from the file's own head and tail as well as its size, so repeat
+        # scans agree but the sampled offsets can't be predicted from the size alone
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(read_at(0))
+        digest.update(read_at(file_size - block))
+        digest.update(str(file_size).encode())
+        rng = random.Random(digest.digest())
+        picks = sorted(rng.sample(range(nblocks), min(nblocks, max(1, sample_bytes // block))))
+
+        # Offsets are visited in ascending order so the reads stay forward-seeking
+        sample = bytearray()
+        for idx in picks:
+            sample += read_at(idx * block)
+    finally:
+        os.close(fd)
+
+    if HAS_NUMPY:
+        hist = _bincount256(np.frombuffer(sample, dtype=np.uint8))
+    else:
+        hist = Counter(sample)
+    return hist, len(sample)
+
+def _counter_entropy(byte_counts, total):
+    """
+    Pure-Python entropy from a Counter of byte values.
+    """
+    # Natural log per bin, with the change of base to 256 applied once at the end
+    probs = (1.0 * count / total for count in byte_counts.values())
+    entropy = -math.fsum(p * math.log(p) for p in probs)
+        
+    return entropy * _INV_LN256
+
 def calculate_entropy(data):
     """
     Calculates the Shannon entropy for the entire data.
     """
     if not data:
         return 0.0
-        
-    byte_counts = [0] * 256
-    for byte in data:
-        byte_counts[byte] += 1
-        
-    entropy = 0.0
-    total = len(data)
-    
-    for count in byte_counts:
-        if count == 0:
-            continue
-        p = 1.0 * count / total
-        entropy -= p * math.log(p, 256)
-        
-    return entropy
+
+    if HAS_NUMPY:
+        return calculate_entropy_from_array(np.frombuffer(data, dtype=np.uint8))
+
+    # Counter tallies the bytes in C rather than with a Python-level loop
+    return _counter_entropy(Counter(data), len(data))
+
+# Classes an ExtraTrees model pickle legitimately references. Anything else in
+# the stream is refused rather than imported, since unpickling runs arbitrary code.
+ALLOWED_CLASSES = {
+    ('sklearn.ensemble._forest', 'ExtraTreesClassifier'),
+    ('sklearn.ensemble.forest', 'ExtraTreesClassifier'),
+    ('sklearn.tree._classes', 'ExtraTreeClassifier'),
+    ('sklearn.tree.tree', 'ExtraTreeClassifier'),
+    ('sklearn.tree._tree', 'Tree'),
+    ('numpy', 'ndarray'),
+    ('numpy', 'dtype'),
+    ('numpy.core.multiarray', '_reconstruct'),
+    ('numpy.core.multiarray', 'scalar'),
+    ('numpy._core.multiarray', '_reconstruct'),
+    ('numpy._core.multiarray', 'scalar'),
+    ('numpy.core.numeric', '_frombuffer'),
+    ('numpy._core.numeric', '_frombuffer'),
+    ('numpy.random._pickle', '__randomstate_ctor'),
+    ('numpy.random._pickle', '__bit_generator_ctor'),
+    ('numpy.random.mtrand', 'RandomState'),
+    ('numpy.random._mt19937', 'MT19937'),
+    ('copyreg', '_reconstructor'),
+    ('_codecs', 'encode'),
+    ('builtins', 'object'),
+}
+
+class RestrictedUnpickler(pickle.Unpickler):
+    """
+    Unpickler that only resolves classes listed in ALLOWED_CLASSES.
+    """
+    def find_class(self, module, name):
+        if (module, name) in ALLOWED_CLASSES:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"Refusing to load '{module}.{name}' from model file")
+
+# Heuristic verdicts: normal, high entropy, low entropy for a large file
+VERDICTS = [
+    ('CLEAN', '\033[92m', "Entropy levels within normal parameters."),
+    ('SUSPICIOUS', '\033[93m', "High entropy detected (> 7.0), indicating packed or encrypted code."),
+    ('SUSPICIOUS', '\033[93m', "Low entropy for large file, possible text disguise."),
+]
 
 class SimpleScanner:
-    def __init__(self, model_path=None):
+    def __init__(self, model_path=None, sample_bytes=1 << 20, trust_joblib=False):
         self.model = None
         self.model_path = model_path
+        # .joblib models bypass the RestrictedUnpickler allowlist, so they need an explicit opt-in
+        self.trust_joblib = trust_joblib
+        # Files over 4x this size get their entropy estimated from a random sample (0 disables)
+        self.sample_bytes = sample_bytes
+        # Reused (1, 2) feature row so each scan doesn't allocate a new array
+        self._feat = np.empty((1, 2), np.float64) if HAS_NUMPY else None
         self.load_model()
 
     def load_model(self):
@@ -53,13 +275,19 @@ class SimpleScanner:
         if self.model_path and os.path.exists(self.model_path):
             print(f"Loading model from {self.model_path}...")
             try:
-                # Try loading with gzip if it ends with .gz
-                if self.model_path.endswith('.gz'):
-                    with gzip.open(self.model_path, 'rb') as f:
-                        self.model = pickle.load(f)
-                else:
-                    with open(self.model_path, 'rb') as f:
-                        self.model = pickle.load(f)
+                if self.model_path.endswith('.joblib'):
+                    self._load_joblib_model()
+                    return
+
+                # Map the whole file in one go rather than pulling it through buffered reads
+                with open(self.model_path, 'rb') as f:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        # Try decompressing with gzip if it ends with .gz
+                        if self.model_path.endswith('.gz'):
+                            self.model = RestrictedUnpickler(io.BytesIO(gzip.decompress(mm))).load()
+                        else:
+                            # Unpickle straight from the mapping, no intermediate copy
+                            self.model = RestrictedUnpickler(mm).load()
                 print("Model loaded successfully.")
             except Exception as e:
                 print(f"Warning: Failed to load model: {e}")
@@ -67,6 +295,22 @@ class SimpleScanner:
         else:
              print("No model provider or model file not found. Using heuristic mode.")
 
+    def _load_joblib_model(self):
+        if not self.trust_joblib:
+            print("Warning: .joblib models can run arbitrary code when loaded and are not checked")
+            print("against the model allowlist. Pass --trust-joblib to load it (running in Heuristic Mode).")
+            return
+
+        if not HAS_JOBLIB:
+            print("Warning: 'joblib' not found. Cannot load .joblib model (running in Heuristic Mode).")
+            print("To enable it, install joblib: pip install joblib")
+            return
+
+        # The tree arrays are memory-mapped straight from disk instead of being
+        # decompressed and copied onto the heap.
+        self.model = joblib.load(self.model_path, mmap_mode='r')
+        print("Model loaded successfully.")
+
     def scan_file(self, file_path):
         if not os.path.exists(file_path):
             print(f"Error: File {file_path} not found.")
@@ -74,35 +318,52 @@ class SimpleScanner:
 
         print(f"Scanning {file_path}...")
         try:
-            with open(file_path, 'rb') as f:
-                data = f.read()
+            file_size = os.path.getsize(file_path)
+            if self.sample_bytes > 0 and file_size > 4 * self.sample_bytes:
+                hist, scanned = _sample_stream(file_path, file_size, self.sample_bytes)
+            else:
+                # Histogram is built while the file is being read, never holding it all in memory
+                hist, scanned = _scan_stream(file_path)
+                file_size = scanned
         except Exception as e:
             print(f"Error reading file: {e}")
             return
-
-        file_size = len(data)
-        entropy = calculate_entropy(data)
         
+        if not scanned:
+            entropy = 0.0
+        elif HAS_NUMPY:
+            entropy = _entropy_from_counts(hist)
+        else:
+            entropy = _counter_entropy(hist, scanned)
+
         print(f"Analysis Results:")
         print(f"  File Size: {file_size} bytes")
-        print(f"  Entropy:   {entropy:.4f}")
+        if scanned < file_size:
+            print(f"  Entropy:   {entropy:.4f} (estimated from {scanned} sampled bytes)")
+        else:
+            print(f"  Entropy:   {entropy:.4f}")
         
         if self.model and HAS_NUMPY:
             # Prepare feature vector: the model likely expects a specific shape
-            features = np.array([[entropy, file_size]]) 
+            features = self._feat
+            features[0, 0] = entropy
+            features[0, 1] = file_size
             
             try:
-                prediction = self.model.predict(features)
                 # Some models might support predict_proba, some might not.
-                # extra trees usually does.
+                # extra trees usually does, and its argmax is exactly what
+                # predict() returns, so the forest is only traversed once.
                 if hasattr(self.model, "predict_proba"):
                     prob = self.model.predict_proba(features)
-                    confidence = max(prob[0]) * 100
+                    label = prob[0].argmax()
+                    predicted = self.model.classes_[label]
+                    confidence = prob[0, label] * 100
                 else:
+                    predicted = self.model.predict(features)[0]
                     confidence = 100.0 # Binary determination
                 
                 # Assuming 1 is Malicious, 0 is Benign (common in this dataset)
-                is_malicious = prediction[0] == 1
+                is_malicious = predicted == 1
                 
                 status = "MALICIOUS" if is_malicious else "BENIGN"
                 color_code = "\033[91m" if is_malicious else "\033[92m" # Red or Green
@@ -122,26 +383,83 @@ class SimpleScanner:
         # High entropy often means packed or encrypted (suspicious)
         print("  [Using Heuristic Analysis]")
 
-        if entropy > 7.0:
-            print("  Verdict:   \033[93mSUSPICIOUS\033[0m")
-            print("  Reason:    High entropy detected (> 7.0), indicating packed or encrypted code.")
-        elif entropy < 3.0 and file_size > 10000:
-             print("  Verdict:   \033[93mSUSPICIOUS\033[0m")
-             print("  Reason:    Low entropy for large file, possible text disguise.")
-        else:
-            print("  Verdict:   \033[92mCLEAN\033[0m")
-            print("  Reason:    Entropy levels within normal parameters.")
+        # Index the verdict table instead of branching; the two conditions are
+        # mutually exclusive so idx is always 0, 1 or 2
+        idx = (entropy > 7.0) + 2 * ((entropy < 3.0) & (file_size > 10000))
+        status, color_code, reason = VERDICTS[idx]
+        print(f"  Verdict:   {color_code}{status}\033[0m")
+        print(f"  Reason:    {reason}")
+
+# Per-process scanner used by scan_directory workers
+_worker_scanner = None
+
+def _init_worker(scanner):
+    global _worker_scanner
+    _worker_scanner = scanner
+
+def _scan_one(file_path):
+    # Capture the report so results from different workers don't interleave
+    out = io.StringIO()
+    with redirect_stdout(out):
+        _worker_scanner.scan_file(file_path)
+    return out.getvalue()
+
+def scan_directory(scanner, directory):
+    """
+    Scans every file under directory in parallel and prints each file's
+    report in walk order. Reports are printed in that order even when a later
+    file finishes first, so one slow file delays the output of the ones after it.
+    """
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if os.path.isfile(path):
+                paths.append(path)
+
+    # On Linux, fork lets workers inherit the already-loaded model copy-on-write
+    # instead of having it pickled to each of them. Elsewhere (notably macOS,
+    # where fork can crash children) the platform's default start method is kept.
+    ctx = None
+    if sys.platform.startswith('linux'):
+        ctx = multiprocessing.get_context('fork')
+
+    with ProcessPoolExecutor(mp_context=ctx, initializer=_init_worker, initargs=(scanner,)) as ex:
+        for report in ex.map(_scan_one, paths, chunksize=8):
+            print(report, end='')
+
+def _sample_size(value):
+    size = int(value)
+    if size != 0 and size < SAMPLE_BLOCK:
+        raise argparse.ArgumentTypeError(f"must be 0 (disabled) or at least {SAMPLE_BLOCK} bytes")
+    return size
 
 def main():
     parser = argparse.ArgumentParser(description="Scan a file for potential malware using static analysis.")
-    parser.add_argument("file", help="Path to the file to scan")
-    parser.add_argument("--model", help="Path to a pickled model file", 
+    parser.add_argument("file", nargs="?", help="Path to the file to scan")
+    parser.add_argument("--dir", help="Scan every file under this directory in parallel")
+    parser.add_argument("--sample-bytes", type=_sample_size, default=1 << 20,
+                        help="Estimate entropy from this many sampled bytes for files larger "
+                             "than 4x this size (0 scans every byte)")
+    parser.add_argument("--model", help="Path to a pickled model file (.pkl/.pkl.gz, or .joblib with --trust-joblib)", 
                         default="vs/models/classifier-model-vs264-extratrees-100-entropy.pkl.gz")
+    parser.add_argument("--trust-joblib", action="store_true",
+                        help="Allow loading a .joblib model. joblib files skip the model class allowlist "
+                             "and can execute arbitrary code, so only use this for files you trust")
     
     args = parser.parse_args()
+    if not args.file and not args.dir:
+        parser.error("a file or --dir is required")
     
-    scanner = SimpleScanner(args.model)
-    scanner.scan_file(args.file)
+    scanner = SimpleScanner(args.model, sample_bytes=args.sample_bytes, trust_joblib=args.trust_joblib)
+    if args.dir:
+        if not os.path.isdir(args.dir):
+            print(f"Error: Directory {args.dir} not found.")
+            return
+        scan_directory(scanner, args.dir)
+    if args.file:
+        scanner.scan_file(args.file)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,127 @@
+import os
+import pickle
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import scanner
+
+
+def test_numba_histogram_matches_bincount(monkeypatch):
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("numba")
+    monkeypatch.setattr(scanner, '_hist_lib', None)
+    monkeypatch.setattr(scanner, '_NUMBA_MIN_BYTES', 0)
+
+    arr = np.frombuffer(os.urandom(100000) + b'\0' * 5000, dtype=np.uint8)
+    kernel = scanner._histogram_for(arr.size)
+    assert kernel is not scanner._bincount256
+    assert (kernel(arr) == np.bincount(arr, minlength=256)).all()
+
+    jitted = scanner.calculate_entropy(arr.tobytes())
+    monkeypatch.setattr(scanner, '_NUMBA_MIN_BYTES', float('inf'))
+    assert jitted == pytest.approx(scanner.calculate_entropy(arr.tobytes()), abs=1e-12)
+
+
+@pytest.mark.parametrize("protocol", [2, 3, 4, 5])
+def test_restricted_unpickler_loads_fitted_forest(tmp_path, protocol):
+    np = pytest.importorskip("numpy")
+    ensemble = pytest.importorskip("sklearn.ensemble")
+
+    X = np.random.RandomState(0).rand(50, 2)
+    y = (X[:, 0] > 0.5).astype(int)
+    model = ensemble.ExtraTreesClassifier(n_estimators=3, random_state=0).fit(X, y)
+
+    path = tmp_path / f"model-p{protocol}.pkl"
+    with open(path, 'wb') as f:
+        pickle.dump(model, f, protocol=protocol)
+
+    loaded = scanner.SimpleScanner(str(path)).model
+    assert isinstance(loaded, ensemble.ExtraTreesClassifier)
+    assert (loaded.predict(X) == model.predict(X)).all()
+
+
+def test_restricted_unpickler_refuses_other_classes(tmp_path):
+    path = tmp_path / "evil.pkl"
+    with open(path, 'wb') as f:
+        pickle.dump(os.system, f)
+
+    with open(path, 'rb') as f:
+        with pytest.raises(pickle.UnpicklingError):
+            scanner.RestrictedUnpickler(f).load()
+
+
+def _run_main(monkeypatch, capsys, *argv):
+    monkeypatch.setattr(sys, 'argv', ['scanner.py', '--model', 'missing-model.pkl'] + list(argv))
+    scanner.main()
+    return capsys.readouterr().out
+
+
+def _entropy_line(out):
+    return next(line for line in out.splitlines() if line.strip().startswith("Entropy:"))
+
+
+def test_sampled_entropy_close_to_full_scan(tmp_path):
+    np = pytest.importorskip("numpy")
+
+    # Skewed byte distribution spread through the whole file
+    rs = np.random.RandomState(0)
+    probs = rs.dirichlet(np.ones(256) * 0.3)
+    data = rs.choice(256, size=8 << 20, p=probs).astype(np.uint8).tobytes()
+    path = tmp_path / "skewed.bin"
+    path.write_bytes(data)
+
+    full_hist, full_total = scanner._scan_stream(str(path))
+    sample_hist, sampled = scanner._sample_stream(str(path), len(data), 1 << 20)
+
+    assert full_total == len(data)
+    assert sampled == 1 << 20
+    full = scanner._entropy_from_counts(full_hist)
+    estimate = scanner._entropy_from_counts(sample_hist)
+    assert abs(estimate - full) < 0.01
+    # Repeat scans draw the same sample
+    assert (scanner._sample_stream(str(path), len(data), 1 << 20)[0] == sample_hist).all()
+
+
+def test_sample_bytes_zero_scans_whole_file(tmp_path, monkeypatch, capsys):
+    data = os.urandom(5 << 20)
+    path = tmp_path / "big.bin"
+    path.write_bytes(data)
+
+    sampled = _run_main(monkeypatch, capsys, str(path))
+    assert "sampled bytes" in _entropy_line(sampled)
+
+    full = _run_main(monkeypatch, capsys, str(path), "--sample-bytes", "0")
+    assert f"File Size: {len(data)} bytes" in full
+    line = _entropy_line(full)
+    assert "sampled" not in line
+    assert line.split()[1] == f"{scanner.calculate_entropy(data):.4f}"
+
+
+def test_small_file_is_scanned_in_full_when_sampling(tmp_path):
+    data = os.urandom(3000)
+    path = tmp_path / "small.bin"
+    path.write_bytes(data)
+
+    _, scanned = scanner._sample_stream(str(path), len(data), scanner.SAMPLE_BLOCK)
+    assert scanned == len(data)
+
+
+def test_dir_reports_each_file_in_walk_order(tmp_path, monkeypatch, capsys):
+    names = ["b.bin", "a.bin", os.path.join("sub", "z.bin"), os.path.join("sub", "deeper", "c.bin"),
+             os.path.join("other", "y.bin")]
+    for name in names:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(os.urandom(512))
+
+    out = _run_main(monkeypatch, capsys, "--dir", str(tmp_path))
+
+    scanned = [line[len("Scanning "):-len("...")] for line in out.splitlines() if line.startswith("Scanning ")]
+    expected = [os.path.join(str(tmp_path), name) for name in
+                ["a.bin", "b.bin", os.path.join("other", "y.bin"),
+                 os.path.join("sub", "z.bin"), os.path.join("sub", "deeper", "c.bin")]]
+    assert scanned == expected
+    assert out.count("Verdict:") == len(names)
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import scanner
+import visualize_entropy
+
+
+def _sample_data():
+    return os.urandom(3000) + b'a' * 700 + bytes(range(256)) * 4 + os.urandom(500)
+
+
+def _assert_matches_per_window(entropies, data, window_size=256, tol=1e-12):
+    assert len(entropies) == len(data) - window_size + 1
+    for i in range(0, len(entropies), 37):
+        assert entropies[i] == pytest.approx(scanner.calculate_entropy(data[i:i + window_size]), abs=tol)
+
+
+def test_sliding_entropy_matches_per_window_entropy(monkeypatch):
+    # Force the pure-Python rolling loop
+    monkeypatch.setattr(visualize_entropy, '_NUMBA_MIN_BYTES', float('inf'))
+    data = _sample_data()
+    _assert_matches_per_window(visualize_entropy.calculate_sliding_entropy(data), data)
+
+
+def test_sliding_entropy_numba_kernel_matches_per_window_entropy(monkeypatch):
+    pytest.importorskip("numba")
+    monkeypatch.setattr(visualize_entropy, '_NUMBA_MIN_BYTES', 0)
+    data = _sample_data()
+    _assert_matches_per_window(visualize_entropy.calculate_sliding_entropy(data), data)
+
+    quantized = visualize_entropy.calculate_sliding_entropy(data, quantize=True)
+    _assert_matches_per_window(quantized / float(visualize_entropy.ENTROPY_SCALE), data, tol=1e-4)
+
+
+def test_block_entropy_matches_per_block_entropy():
+    data = _sample_data()
+    entropies = visualize_entropy.calculate_local_entropy(data)
+    expected = [scanner.calculate_entropy(data[i:i + 256]) for i in range(0, len(data), 256)]
+    assert entropies == pytest.approx(expected, abs=1e-12)
@@ -1,46 +1,225 @@
 import sys
 import os
 import math
+import mmap
 import argparse
+from array import array
+from collections import Counter
+from functools import lru_cache
 
 try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+try:
+    import matplotlib
+    # Render off-screen: skips GUI backend imports and display probing in headless runs
+    matplotlib.use('Agg')
     import matplotlib.pyplot as plt
     HAS_MATPLOTLIB = True
 except ImportError:
     HAS_MATPLOTLIB = False
 
-def calculate_local_entropy(data, window_size=256):
+_INV_LN256 = 1.0 / math.log(256)
+
+# int16 full scale for quantized entropies (0.0 - 1.0 maps to 0 - ENTROPY_SCALE)
+ENTROPY_SCALE = 32767
+
+@lru_cache(maxsize=None)
+def _xlogx_table(size):
+    """
+    Lookup table of c * ln(c) for every count 0..size. A window of N bytes has
+    entropy (ln N - sum(LUT[counts]) / N) / ln 256, so no per-bin log is needed.
+    """
+    table = [0.0] + [c * math.log(c) for c in range(1, size + 1)]
+    if HAS_NUMPY:
+        return np.array(table)
+    return table
+
+def _chunk_entropy(chunk):
+    """
+    Calculates the Shannon entropy of a single chunk, normalised to 0.0 - 1.0.
+    """
+    byte_counts = Counter(chunk)
+
+    length = len(chunk)
+    lut = _xlogx_table(length)
+    clogc = sum(lut[count] for count in byte_counts.values())
+
+    entropy = (math.log(length) - clogc / length) * _INV_LN256
+    return max(0.0, float(entropy))
+
+def _row_entropies(mat):
+    """
+    Vectorized entropy of every row of an (n, window_size) uint8 matrix,
+    using one 2-D histogram built with np.add.at.
+    """
+    n, window_size = mat.shape
+    H = np.zeros((n, 256), dtype=np.int32)
+    rows = np.repeat(np.arange(n), window_size)
+    np.add.at(H, (rows, mat.ravel()), 1)
+
+    # Fancy-index the c*ln(c) table instead of evaluating 256 logs per row
+    clogc = _xlogx_table(window_size)[H].sum(axis=1)
+    entropies = (math.log(window_size) - clogc / window_size) * _INV_LN256
+    return np.maximum(entropies, 0.0)
+
+def _block_entropies(data, window_size, quantize=False, batch=4096):
+    """
+    Vectorized entropy of every window_size block: the file is reshaped into
+    an (nblocks, window_size) matrix and histogrammed a batch of rows at a time,
+    each batch written straight into the result (int16 when quantize). A
+    trailing partial block is scored on its own length.
+    """
+    arr = np.frombuffer(data, dtype=np.uint8)
+    n = arr.size // window_size
+    mat = arr[:n * window_size].reshape(n, window_size)
+    has_tail = arr.size > n * window_size
+
+    entropies = np.empty(n + has_tail, dtype=np.int16 if quantize else np.float64)
+    for start in range(0, n, batch):
+        stop = min(start + batch, n)
+        rows = _row_entropies(mat[start:stop])
+        entropies[start:stop] = _quantize(rows) if quantize else rows
+    if has_tail:
+        tail = _chunk_entropy(arr[n * window_size:])
+        entropies[n] = _quantize(tail) if quantize else tail
+    return entropies
+
+def _quantize(entropies):
+    """
+    Packs 0.0 - 1.0 entropies into int16, a quarter of the float64 footprint;
+    divide by ENTROPY_SCALE to get them back.
+    """
+    return np.rint(np.asarray(entropies) * ENTROPY_SCALE).astype(np.int16)
+
+def _rolling_kernel(buf, window_size, lut, scale, offset, out):
+    # Rolling-histogram sliding entropy over a uint8 view, compiled by numba
+    # on first use. out[k] gets the entropy of buf[k:k + window_size], times
+    # scale plus offset (0.5 rounds when out is an int16 array).
+    counts = np.zeros(256, np.int64)
+    for j in range(window_size):
+        counts[buf[j]] += 1
+    clogc = 0.0
+    for c in counts:
+        clogc += lut[c]
+    log_w = math.log(window_size)
+
+    value = (log_w - clogc / window_size) * _INV_LN256 * scale + offset
+    out[0] = value
+    for i in range(window_size, buf.size):
+        old = buf[i - window_size]
+        new = buf[i]
+        if old != new:
+            c = counts[old]
+            clogc += lut[c - 1] - lut[c]
+            counts[old] = c - 1
+            c = counts[new]
+            clogc += lut[c + 1] - lut[c]
+            counts[new] = c + 1
+            value = (log_w - clogc / window_size) * _INV_LN256 * scale + offset
+        out[i - window_size + 1] = value
+
+# None until first use, then the jitted kernel or False if numba is unavailable
+_rolling_nb = None
+
+# Below this many bytes the pure-Python loop finishes before numba would
+# have been imported and the kernel loaded
+_NUMBA_MIN_BYTES = 1 << 20
+
+def _numba_rolling_kernel():
+    """
+    Imports numba lazily and JIT-compiles the rolling kernel the first time
+    it is needed.
+    """
+    global _rolling_nb
+    if _rolling_nb is None:
+        try:
+            from numba import njit
+            _rolling_nb = njit(cache=True)(_rolling_kernel)
+        except ImportError:
+            _rolling_nb = False
+    return _rolling_nb
+
+def calculate_sliding_entropy(data, window_size=256, quantize=False):
+    """
+    Calculates the Shannon entropy of every overlapping window_size window,
+    advancing one byte at a time. With quantize (NumPy only) the result is an
+    int16 array scaled by ENTROPY_SCALE.
+    """
+    quantize = quantize and HAS_NUMPY
+    if len(data) < window_size:
+        return _quantize([0]) if quantize else [0]
+
+    # Rolling histogram: each step only adjusts the bins of the byte leaving
+    # and the byte entering the window, keeping sum(c * ln c) up to date, so
+    # the whole scan is O(N) rather than O(N * window_size).
+    kernel = _numba_rolling_kernel() if HAS_NUMPY and len(data) >= _NUMBA_MIN_BYTES else None
+    if kernel:
+        entropies = np.empty(len(data) - window_size + 1, dtype=np.int16 if quantize else np.float64)
+        kernel(np.frombuffer(data, dtype=np.uint8), window_size, _xlogx_table(window_size),
+               ENTROPY_SCALE if quantize else 1.0, 0.5 if quantize else 0.0, entropies)
+        return entropies if quantize else entropies.tolist()
+
+    byte_counts = [0] * 256
+    for byte in data[:window_size]:
+        byte_counts[byte] += 1
+    lut = _xlogx_table(window_size)
+    if HAS_NUMPY:
+        # Plain floats: per-step arithmetic on numpy scalars is much slower
+        lut = lut.tolist()
+    clogc = sum(lut[c] for c in byte_counts)
+    log_w = math.log(window_size)
+
+    # Quantized values go into a compact int16 buffer as they are produced
+    entropies = array('h') if quantize else []
+    scale = ENTROPY_SCALE if quantize else 1.0
+
+    value = (log_w - clogc / window_size) * _INV_LN256 * scale
+    entropies.append(int(value + 0.5) if quantize else value)
+    for i in range(window_size, len(data)):
+        old, new = data[i - window_size], data[i]
+        if old != new:
+            c = byte_counts[old]
+            clogc += lut[c - 1] - lut[c]
+            byte_counts[old] = c - 1
+            c = byte_counts[new]
+            clogc += lut[c + 1] - lut[c]
+            byte_counts[new] = c + 1
+            value = (log_w - clogc / window_size) * _INV_LN256 * scale
+        entropies.append(int(value + 0.5) if quantize else value)
+
+    if quantize:
+        return np.frombuffer(entropies, dtype=np.int16)
+    return entropies
+
+def calculate_local_entropy(data, window_size=256, quantize=False):
     """
     Calculates the Shannon entropy for a sliding window or chunks of the data.
+    With quantize (NumPy only) the result is an int16 array scaled by ENTROPY_SCALE.
     """
     entropies = []
     if len(data) < window_size:
-        return [0]
+        return _quantize([0]) if quantize and HAS_NUMPY else [0]
+
+    if HAS_NUMPY:
+        entropies = _block_entropies(data, window_size, quantize=quantize)
+        return entropies if quantize else entropies.tolist()
     
-    for i in range(0, len(data), window_size):
-        chunk = data[i:i+window_size]
-        if not chunk:
-            break
-        
-        # Calculate entropy for this chunk
-        byte_counts = [0] * 256
-        for byte in chunk:
-            byte_counts[byte] += 1
+    # Slicing a memoryview doesn't copy, unlike slicing bytes or an mmap
+    with memoryview(data) as mv:
+        for i in range(0, len(mv), window_size):
+            chunk = mv[i:i+window_size]
+            if not chunk:
+                break
             
-        entropy = 0.0
-        length = len(chunk)
-        
-        for count in byte_counts:
-            if count == 0:
-                continue
-            p = 1.0 * count / length
-            entropy -= p * math.log(p, 256)
-            
-        entropies.append(entropy)
+            entropies.append(_chunk_entropy(chunk))
         
     return entropies
 
-def visualize_file(file_path, output_image):
+def visualize_file(file_path, output_image, sliding=False):
     if not HAS_MATPLOTLIB:
         print("Error: 'matplotlib' not found. Cannot generate entropy graph.")
         print("To enable visualization, install matplotlib: pip install matplotlib")
@@ -50,21 +229,44 @@ def visualize_file(file_path, output_image):
         print(f"Error: File {file_path} not found.")
         return
 
+    entropy_fn = calculate_sliding_entropy if sliding else calculate_local_entropy
+
     print(f"Reading {file_path}...")
     try:
         with open(file_path, 'rb') as f:
-            data = f.read()
+            file_size = os.fstat(f.fileno()).st_size
+            print(f"Calculating entropy (Size: {file_size} bytes)...")
+            if file_size:
+                # Windows are read straight from the mapping, no full in-memory copy
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    entropies = entropy_fn(mm, window_size=256, quantize=HAS_NUMPY)
+            else:
+                entropies = entropy_fn(b'', window_size=256, quantize=HAS_NUMPY)
     except Exception as e:
         print(f"Error reading file: {e}")
         return
 
-    print(f"Calculating entropy (Size: {len(data)} bytes)...")
-    entropies = calculate_local_entropy(data, window_size=256)
+    # A 12-inch figure can't resolve more than a few thousand points, so reduce
+    # each bucket of step values to its min/max envelope. Taking every step-th
+    # value instead would drop short high-entropy regions (e.g. a few packed blocks).
+    values = np.asarray(entropies) # matplotlib itself requires numpy
+    step = max(1, len(values) // 4000)
+    x = np.arange(0, len(values), step)
+    hi = np.maximum.reduceat(values, x)
+    lo = np.minimum.reduceat(values, x)
+    if values.dtype == np.int16:
+        # Back to 0.0 - 1.0 only for the points actually drawn
+        hi = hi / float(ENTROPY_SCALE)
+        lo = lo / float(ENTROPY_SCALE)
 
     plt.figure(figsize=(12, 6))
-    plt.plot(entropies, color='blue', linewidth=0.5)
+    plt.fill_between(x, lo, hi, color='blue', alpha=0.3, linewidth=0, rasterized=True)
+    plt.plot(x, hi, color='blue', linewidth=0.5, rasterized=True)
     plt.title(f'Entropy Visualization: {os.path.basename(file_path)}')
-    plt.xlabel('Block Index (256 bytes per block)')
+    if sliding:
+        plt.xlabel('Window Offset (256-byte window, 1-byte step)')
+    else:
+        plt.xlabel('Block Index (256 bytes per block)')
     plt.ylabel('Entropy (0.0 - 1.0)')
     plt.ylim(0, 1.0)
     plt.grid(True, which='both', linestyle='--', linewidth=0.5)
@@ -73,17 +275,19 @@ def visualize_file(file_path, output_image):
     # plt.fill_between(range(len(entropies)), entropies, color='blue', alpha=0.1)
 
     print(f"Saving plot to {output_image}...")
-    plt.savefig(output_image)
+    plt.savefig(output_image, dpi=100)
     print("Done.")
 
 def main():
     parser = argparse.ArgumentParser(description="Visualize the entropy of a file to detect packed/encrypted sections.")
     parser.add_argument("file", help="Path to the file to scan")
     parser.add_argument("-o", "--output", help="Output image path", default="entropy_plot.png")
+    parser.add_argument("--sliding", action="store_true",
+                        help="Use overlapping windows (1-byte step) instead of fixed 256-byte blocks")
     
     args = parser.parse_args()
     
-    visualize_file(args.file, args.output)
+    visualize_file(args.file, args.output, sliding=args.sliding)
 
 if __name__ == "__main__":
     main()